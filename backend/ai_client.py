@@ -3,33 +3,273 @@ Cliente da API da OpenAI para análise das campanhas com o modelo gpt-4o-mini.
 """
 from __future__ import annotations
 
-from typing import List, Dict, Optional
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Dict, Optional
+import numpy as np
 import pandas as pd
+import tiktoken
+from cachetools import LRUCache
 
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+try:  # serializador em C; json da stdlib como alternativa
+    from orjson import dumps as _json_dumps
+except ImportError:  # pragma: no cover
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+
+# Parâmetros de geração comuns a todas as chamadas
+_COMPLETION_PARAMS: Dict[str, Any] = {
+    "model": "gpt-4o-mini",
+    "temperature": 0.25,
+    "frequency_penalty": 0.2,
+    "presence_penalty": 0.1,
+}
+
+
+# Orçamento de tokens para o histórico do chat enviado junto de cada pergunta
+HISTORY_TOKEN_BUDGET = 2000
+
+
+# Tokenizer carregado sob demanda. Na primeira vez o tiktoken baixa o vocabulário (sem
+# timeout), então o carregamento nunca roda no event loop: só em threads (`warm_tokenizer`
+# e a montagem das mensagens). Uma falha não fica memorizada; nova tentativa após o intervalo.
+_ENCODING_RETRY_AFTER = 60.0
+_encoding_state: Dict[str, Any] = {"encoding": None, "failed_at": None}
+_encoding_lock = threading.Lock()
+
+
+def _encoding():
+    """Tokenizer do gpt-4o-mini; None enquanto o vocabulário não puder ser carregado (ex.: sem rede)."""
+    if _encoding_state["encoding"] is not None:
+        return _encoding_state["encoding"]
+    failed_at = _encoding_state["failed_at"]
+    if failed_at is not None and time.monotonic() - failed_at < _ENCODING_RETRY_AFTER:
+        return None
+    # Só uma thread carrega; as demais usam a estimativa em vez de esperar o download
+    if not _encoding_lock.acquire(blocking=False):
+        return None
+    try:
+        if _encoding_state["encoding"] is None:
+            _encoding_state["encoding"] = tiktoken.encoding_for_model("gpt-4o-mini")
+            _encoding_state["failed_at"] = None
+    except Exception:
+        _encoding_state["failed_at"] = time.monotonic()
+    finally:
+        _encoding_lock.release()
+    return _encoding_state["encoding"]
+
+
+def warm_tokenizer() -> None:
+    """Carrega o tokenizer em segundo plano (thread daemon), sem bloquear quem chama."""
+    threading.Thread(target=_encoding, name="tiktoken-warmup", daemon=True).start()
+
+
+def _count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        # Estimativa grosseira: ~4 caracteres por token
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _fit_history(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """Mantém as mensagens mais recentes do histórico que cabem em `budget` tokens."""
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for m in reversed(history):
+        used += _count_tokens(m.get("content", ""))
+        if used > budget:
+            break
+        kept.append(m)
+    kept.reverse()
+    return kept
+
+
+@lru_cache(maxsize=4)
+def _get_client(api_key: str) -> AsyncOpenAI:
+    """Reaproveita o cliente (e o pool de conexões HTTP) entre chamadas com a mesma chave."""
+    return AsyncOpenAI(api_key=api_key, timeout=60.0, max_retries=3)
+
+
+# Sem streaming nada chega antes do fim da geração; respostas longas precisam de um
+# timeout proporcional a max_tokens (piso conservador de ~50 tokens/s), senão o timeout
+# vira retry pago da geração inteira e conta como falha no circuit breaker.
+_MIN_COMPLETION_TIMEOUT = 60.0
+_OUTPUT_TOKENS_PER_SECOND = 50.0
+
+
+def _completion_timeout(max_tokens: int) -> float:
+    return max(_MIN_COMPLETION_TIMEOUT, 15.0 + max_tokens / _OUTPUT_TOKENS_PER_SECOND)
+
+
+# Circuit breaker: após falhas transitórias seguidas (já esgotados os retries com
+# backoff exponencial do SDK), recusa novas chamadas por um tempo em vez de enfileirá-las.
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 30.0
+_TRANSIENT_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+_breaker: Dict[str, float] = {"failures": 0, "opened_at": 0.0}
+
+
+# Limite de chamadas simultâneas à OpenAI (protege RPM/TPM da conta) e chamadas
+# idênticas em andamento, que são compartilhadas em vez de repetidas.
+_MAX_CONCURRENT_COMPLETIONS = 8
+_completion_slots = asyncio.Semaphore(_MAX_CONCURRENT_COMPLETIONS)
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _check_breaker() -> None:
+    if _breaker["failures"] >= _BREAKER_THRESHOLD and time.monotonic() - _breaker["opened_at"] < _BREAKER_COOLDOWN:
+        raise RuntimeError("OpenAI indisponível no momento (muitas falhas seguidas); tente novamente em instantes.")
+
+
+def _record_failure() -> None:
+    _breaker["failures"] += 1
+    if _breaker["failures"] >= _BREAKER_THRESHOLD:
+        _breaker["opened_at"] = time.monotonic()
+
+
+async def _call_openai(client: AsyncOpenAI, kwargs: Dict[str, Any]) -> Any:
+    async with _completion_slots:
+        try:
+            result = await client.chat.completions.create(**kwargs)
+        except _TRANSIENT_ERRORS:
+            _record_failure()
+            raise
+    _breaker["failures"] = 0
+    return result
+
+
+async def _stream_completion(client: AsyncOpenAI, **kwargs: Any) -> AsyncIterator[Any]:
+    """Chunks de uma completion em streaming, com o slot ocupado até o fim da geração.
+
+    O limite de concorrência vale para o tempo em que os tokens são gerados, não só
+    para o create(). Uma falha no meio do stream (a conexão já tinha sido aceita)
+    conta para o circuit breaker como falha transitória.
+    """
+    _check_breaker()
+    async with _completion_slots:
+        try:
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+        except _TRANSIENT_ERRORS:
+            _record_failure()
+            raise
+        try:
+            async with stream:
+                async for chunk in stream:
+                    yield chunk
+        except Exception:
+            _record_failure()
+            raise
+    _breaker["failures"] = 0
+
+
+def _inflight_key(client: AsyncOpenAI, kwargs: Dict[str, Any]) -> str:
+    payload = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{client.api_key}\0{payload}".encode("utf-8")).hexdigest()
+
+
+def _forget_inflight(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # marca a exceção como consumida mesmo sem ninguém aguardando
+
+
+async def _create_completion(client: AsyncOpenAI, **kwargs: Any) -> Any:
+    """Completion sem streaming; streams passam por `_stream_completion` (um único consumidor)."""
+    _check_breaker()
+    key = _inflight_key(client, kwargs)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_call_openai(client, kwargs))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+    # shield: se um dos clientes desconectar, a chamada continua para os demais
+    return await asyncio.shield(task)
+
+
+# Colunas enviadas no CSV completo de cada nível (as demais não são usadas na análise)
+_METRIC_COLS = ["spend", "roas", "purchases", "purchase_value", "ctr", "cpc", "spend_share", "rev_share"]
+_ESSENTIAL_COLS = {
+    "campaign": ["campaign_name", "campaign_id", *_METRIC_COLS],
+    "adset": ["adset_name", "adset_id", "campaign_id", *_METRIC_COLS],
+    "ad": ["ad_name", "ad_id", "adset_id", "campaign_id", *_METRIC_COLS],
+}
+_CSV_ROUNDING = {"roas": 2, "ctr": 4, "cpc": 4, "spend": 2, "purchase_value": 2, "spend_share": 2, "rev_share": 2}
+
+
+def _essential_view(df: pd.DataFrame, level: str) -> pd.DataFrame:
+    """Recorta as colunas essenciais do nível e arredonda para reduzir tokens do prompt."""
+    return df[[c for c in _ESSENTIAL_COLS[level] if c in df.columns]].round(_CSV_ROUNDING)
+
+
+def _attach_shares(df: pd.DataFrame) -> None:
+    """Adiciona spend_share e rev_share (% do total do nível) direto sobre arrays NumPy."""
+    spend = df["spend"].to_numpy(dtype=np.float64)
+    rev = df["purchase_value"].to_numpy(dtype=np.float64)
+    total_spend = float(spend.sum()) or 1.0
+    total_rev = float(rev.sum()) or 1.0
+    df["spend_share"] = spend * (100.0 / total_spend)
+    df["rev_share"] = rev * (100.0 / total_rev)
+
+
+def _csv_cell(value: Any) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    text = str(value)
+    if any(c in text for c in ',"\n\r'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _fmt_float(value: float) -> str:
+    """Até 4 casas, sem zeros à direita; NaN vira célula vazia."""
+    return "" if value != value else f"{value:.4f}".rstrip("0").rstrip(".")
+
+
+def _df_to_csv(df: pd.DataFrame) -> str:
+    """CSV compacto para o prompt (substitui `to_csv`).
+
+    O ganho é em tokens: floats saem com até 4 casas e sem zeros à direita, e
+    textos são citados só quando contêm vírgula, aspas ou quebra de linha. Uma
+    única conversão para objetos Python e um loop simples por coluna mantêm o
+    custo abaixo do `to_csv` também nos recortes pequenos (top 5).
+    """
+    formatters = [_fmt_float if d.kind == "f" else str if d.kind in "iub" else _csv_cell for d in df.dtypes]
+    columns = [list(map(fmt, values)) for fmt, values in zip(formatters, df.to_numpy(dtype=object).T.tolist())]
+    header = ",".join(_csv_cell(c) for c in df.columns)
+    return "\n".join([header, *(",".join(row) for row in zip(*columns))]) + "\n"
 
 
 def _top_n(df: pd.DataFrame, by: str, n: int = 5, cols: Optional[List[str]] = None) -> str:
     if df.empty or by not in df.columns:
         return "(sem dados)"
-    view = df.sort_values(by=by, ascending=False).head(n)
+    view = df.nlargest(n, by)
     if cols:
         view = view[[c for c in cols if c in view.columns]]
-    return view.to_csv(index=False)
+    return _df_to_csv(view)
 
 
 def _stats_block(df: pd.DataFrame, label: str, metrics: Optional[List[str]] = None) -> str:
     if df.empty:
         return f"[{label} Stats]\n(sem dados)"
     metrics = metrics or ["roas", "purchases", "purchase_value", "ctr", "cpc", "spend"]
+    present = [m for m in metrics if m in df.columns and df[m].dtype != "O"]
     parts: List[str] = [f"[{label} Stats]"]
-    for m in metrics:
-        if m in df.columns and df[m].dtype != "O":
-            series = pd.to_numeric(df[m], errors="coerce").fillna(0)
-            q25 = float(series.quantile(0.25))
-            med = float(series.quantile(0.50))
-            q75 = float(series.quantile(0.75))
-            parts.append(f"- {m}: p25={q25:.2f} · p50={med:.2f} · p75={q75:.2f}")
+    if present:
+        # Um único quantile sobre todas as métricas (3 x N) em vez de 3 chamadas por métrica
+        q = df[present].apply(pd.to_numeric, errors="coerce").fillna(0).quantile([0.25, 0.50, 0.75])
+        parts.extend(
+            f"- {m}: p25={q.at[0.25, m]:.2f} · p50={q.at[0.50, m]:.2f} · p75={q.at[0.75, m]:.2f}"
+            for m in present
+        )
     return "\n".join(parts)
 
 
@@ -45,80 +285,66 @@ def _build_prompt(
 
     Inclui tabela CSV com métricas essenciais para permitir análise numérica.
     """
+    df_c = pd.DataFrame(campaigns) if campaigns else None
+    df_s = pd.DataFrame(adsets) if adsets else None
+    df_a = pd.DataFrame(ads) if ads else None
+
+    # Resumo de disponibilidade de dados (ajuda a evitar alucinações): lista só as
+    # colunas que de fato vão no CSV de cada nível
+    summary_lines: List[str] = []
     csv_sections = []
 
-    if campaigns:
-        df_c = pd.DataFrame(campaigns)
+    if df_c is not None:
         # shares de orçamento e receita
         if not df_c.empty:
-            total_spend_c = float(df_c["spend"].sum()) or 1.0
-            total_rev_c = float(df_c["purchase_value"].sum()) or 1.0
-            df_c["spend_share"] = (df_c["spend"] / total_spend_c) * 100
-            df_c["rev_share"] = (df_c["purchase_value"] / total_rev_c) * 100
+            _attach_shares(df_c)
         if not df_c.empty and "roas" in df_c.columns:
             df_c = df_c.sort_values(by="roas", ascending=False)
-        csv_sections.append("[Campanhas]\n" + df_c.to_csv(index=False))
+        view = _essential_view(df_c, "campaign")
+        summary_lines.append(f"Campanhas: {len(df_c)} linhas • colunas: {', '.join(view.columns)}")
+        csv_sections.append("[Campanhas]\n" + _df_to_csv(view))
 
-    if adsets:
-        df_s = pd.DataFrame(adsets)
+    if df_s is not None:
         if not df_s.empty:
-            total_spend_s = float(df_s["spend"].sum()) or 1.0
-            total_rev_s = float(df_s["purchase_value"].sum()) or 1.0
-            df_s["spend_share"] = (df_s["spend"] / total_spend_s) * 100
-            df_s["rev_share"] = (df_s["purchase_value"] / total_rev_s) * 100
+            _attach_shares(df_s)
         if not df_s.empty and "roas" in df_s.columns:
             df_s = df_s.sort_values(by="roas", ascending=False)
-        csv_sections.append("[Conjuntos]\n" + df_s.to_csv(index=False))
+        view = _essential_view(df_s, "adset")
+        summary_lines.append(f"Conjuntos: {len(df_s)} linhas • colunas: {', '.join(view.columns)}")
+        csv_sections.append("[Conjuntos]\n" + _df_to_csv(view))
 
-    if ads:
-        df_a = pd.DataFrame(ads)
+    if df_a is not None:
         if not df_a.empty:
-            total_spend_a = float(df_a["spend"].sum()) or 1.0
-            total_rev_a = float(df_a["purchase_value"].sum()) or 1.0
-            df_a["spend_share"] = (df_a["spend"] / total_spend_a) * 100
-            df_a["rev_share"] = (df_a["purchase_value"] / total_rev_a) * 100
+            _attach_shares(df_a)
         if not df_a.empty and "roas" in df_a.columns:
             df_a = df_a.sort_values(by="roas", ascending=False)
-        csv_sections.append("[Anúncios]\n" + df_a.to_csv(index=False))
+        view = _essential_view(df_a, "ad")
+        summary_lines.append(f"Anúncios: {len(df_a)} linhas • colunas: {', '.join(view.columns)}")
+        csv_sections.append("[Anúncios]\n" + _df_to_csv(view))
 
     csv_view = "\n\n".join(csv_sections) if csv_sections else "(sem dados)"
-
-    # Resumo de disponibilidade de dados e colunas (ajuda a evitar alucinações)
-    summary_lines: List[str] = []
-    if campaigns:
-        dfc = pd.DataFrame(campaigns)
-        summary_lines.append(f"Campanhas: {len(dfc)} linhas • colunas: {', '.join(list(dfc.columns))}")
-    if adsets:
-        dfs = pd.DataFrame(adsets)
-        summary_lines.append(f"Conjuntos: {len(dfs)} linhas • colunas: {', '.join(list(dfs.columns))}")
-    if ads:
-        dfa = pd.DataFrame(ads)
-        summary_lines.append(f"Anúncios: {len(dfa)} linhas • colunas: {', '.join(list(dfa.columns))}")
     availability = "\n".join(summary_lines) if summary_lines else "Nenhum dado disponível no período."
 
     # Destaques para facilitar respostas objetivas
     highlights_parts: List[str] = []
-    if campaigns:
-        dfc = pd.DataFrame(campaigns)
-        highlights_parts.append("[Top Campanhas por ROAS]\n" + _top_n(dfc, "roas", cols=["campaign_name","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
-    if adsets:
-        dfs = pd.DataFrame(adsets)
-        highlights_parts.append("[Top Conjuntos por ROAS]\n" + _top_n(dfs, "roas", cols=["adset_name","adset_id","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
-    if ads:
-        dfa = pd.DataFrame(ads)
-        highlights_parts.append("[Top Anúncios por ROAS]\n" + _top_n(dfa, "roas", cols=["ad_name","ad_id","adset_id","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
-        highlights_parts.append("[Top Anúncios por Compras]\n" + _top_n(dfa, "purchases", cols=["ad_name","ad_id","purchases","purchase_value","roas","ctr","cpc","spend"]))
-        highlights_parts.append("[Top Anúncios por CTR]\n" + _top_n(dfa, "ctr", cols=["ad_name","ad_id","ctr","roas","purchases","spend"]))
+    if df_c is not None:
+        highlights_parts.append("[Top Campanhas por ROAS]\n" + _top_n(df_c, "roas", cols=["campaign_name","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
+    if df_s is not None:
+        highlights_parts.append("[Top Conjuntos por ROAS]\n" + _top_n(df_s, "roas", cols=["adset_name","adset_id","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
+    if df_a is not None:
+        highlights_parts.append("[Top Anúncios por ROAS]\n" + _top_n(df_a, "roas", cols=["ad_name","ad_id","adset_id","campaign_id","roas","purchase_value","purchases","ctr","cpc","spend"]))
+        highlights_parts.append("[Top Anúncios por Compras]\n" + _top_n(df_a, "purchases", cols=["ad_name","ad_id","purchases","purchase_value","roas","ctr","cpc","spend"]))
+        highlights_parts.append("[Top Anúncios por CTR]\n" + _top_n(df_a, "ctr", cols=["ad_name","ad_id","ctr","roas","purchases","spend"]))
     highlights = "\n\n".join([p for p in highlights_parts if p]) if highlights_parts else "(sem destaques)"
 
     # Estatísticas de benchmarks por nível
     stats_blocks: List[str] = []
-    if campaigns:
-        stats_blocks.append(_stats_block(pd.DataFrame(campaigns), "Campanhas"))
-    if adsets:
-        stats_blocks.append(_stats_block(pd.DataFrame(adsets), "Conjuntos"))
-    if ads:
-        stats_blocks.append(_stats_block(pd.DataFrame(ads), "Anúncios"))
+    if df_c is not None:
+        stats_blocks.append(_stats_block(df_c, "Campanhas"))
+    if df_s is not None:
+        stats_blocks.append(_stats_block(df_s, "Conjuntos"))
+    if df_a is not None:
+        stats_blocks.append(_stats_block(df_a, "Anúncios"))
     stats_text = "\n".join(stats_blocks) if stats_blocks else "(sem estatísticas)"
 
     grounding_rules = (
@@ -141,20 +367,20 @@ def _build_prompt(
 
     # Estilos de resposta dinâmicos por intenção
     style_guidance: List[str] = []
-    intents = intents or []
-    if any(i in intents for i in ["analise_criativos", "creative_strategy", "criativos"]):
+    intent_set = set(intents or ())
+    if not intent_set.isdisjoint({"analise_criativos", "creative_strategy", "criativos"}):
         style_guidance.append(
             "Modo: Relatório de criativos — comece listando os 3–5 melhores anúncios por objetivo (ROAS, compras, CTR), depois insights sobre padrões de criativos (formato, ângulos, hooks) e um plano de teste A/B multivariado (3 hipóteses)."
         )
-    if any(i in intents for i in ["alocacao_orcamento", "budget_plan", "escala", "growth"]):
+    if not intent_set.isdisjoint({"alocacao_orcamento", "budget_plan", "escala", "growth"}):
         style_guidance.append(
             "Modo: Plano de orçamento — traga uma tabela (texto) de realocação com campanha/conjunto/anúncio, spend_share atual → sugerido, e justificativa breve; finalize com regras automáticas (limiares de pausa/escala)."
         )
-    if any(i in intents for i in ["diagnostico", "troubleshooting", "queda"]):
+    if not intent_set.isdisjoint({"diagnostico", "troubleshooting", "queda"}):
         style_guidance.append(
             "Modo: Diagnóstico — destaque quedas versus mediana (p50) e aponte 3 causas prováveis por nível, com passos de correção imediatos."
         )
-    if any(i in intents for i in ["novo_produto", "go_to_market", "estrutura", "funnel", "funil"]):
+    if not intent_set.isdisjoint({"novo_produto", "go_to_market", "estrutura", "funnel", "funil"}):
         style_guidance.append(
             "Modo: Go-to-market — proponha estrutura Prospecting/Retargeting/Retention, com metas de CTR/CPC/ROAS e orçamentos iniciais proporcionais; inclua timeline de 2 semanas com checkpoints."
         )
@@ -163,30 +389,138 @@ def _build_prompt(
 
     style_text = "\n".join(style_guidance)
 
-    instructions = (
-        "Contexto: Você é um analista de mídia focado em Meta Ads.\n"
-        f"{grounding_rules}\n"
-        "Evite clichês e conselhos genéricos. Não repita frases. Adapte o formato ao objetivo da pergunta.\n"
-        f"{style_text}\n"
-        f"{output_format}"
+    parts: List[str] = [
+        "Contexto: Você é um analista de mídia focado em Meta Ads.\n",
+        grounding_rules,
+        "\nEvite clichês e conselhos genéricos. Não repita frases. Adapte o formato ao objetivo da pergunta.\n",
+        style_text,
+        "\n",
+        output_format,
+        "\n",
+    ]
+    if period_label:
+        parts.append(f"Período analisado: {period_label}\n")
+    if user_query:
+        parts.append(f"\nPergunta do usuário: {user_query}\n")
+    parts += [
+        "\nDisponibilidade de dados:\n", availability,
+        "\n\nBenchmarks (p25/p50/p75):\n", stats_text,
+        "\n\nDestaques calculados:\n", highlights,
+        "\n\nDados completos (CSV):\n", csv_view, "\n",
+    ]
+    return "".join(parts)
+
+
+# Prompts montados recentemente, indexados pelo sha256 das entradas: a chave não retém
+# as listas completas e, num acerto, elas nem precisam ser desserializadas.
+_PROMPT_CACHE: LRUCache = LRUCache(maxsize=32)
+_PROMPT_CACHE_LOCK = threading.Lock()
+
+
+def _prompt_key(
+    campaigns: Optional[List[Dict]],
+    adsets: Optional[List[Dict]],
+    ads: Optional[List[Dict]],
+    user_query: str | None,
+    period_label: str | None,
+    intents: Optional[List[str]],
+) -> str:
+    payload = _json_dumps([campaigns, adsets, ads, user_query, period_label, list(intents or ())])
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _make_prompt(
+    campaigns: Optional[List[Dict]],
+    adsets: Optional[List[Dict]],
+    ads: Optional[List[Dict]],
+    user_query: str | None,
+    period_label: str | None,
+    intents: Optional[List[str]],
+    cache_prompt: bool,
+) -> str:
+    if not cache_prompt:
+        return _build_prompt(campaigns=campaigns, adsets=adsets, ads=ads, user_query=user_query, period_label=period_label, intents=intents)
+
+    key = _prompt_key(campaigns, adsets, ads, user_query, period_label, intents)
+    with _PROMPT_CACHE_LOCK:
+        prompt = _PROMPT_CACHE.get(key)
+    if prompt is None:
+        prompt = _build_prompt(campaigns=campaigns, adsets=adsets, ads=ads, user_query=user_query, period_label=period_label, intents=intents)
+        with _PROMPT_CACHE_LOCK:
+            _PROMPT_CACHE[key] = prompt
+    return prompt
+
+
+def _build_messages(
+    prompt: str,
+    history: Optional[List[Dict[str, str]]] = None,
+    history_token_budget: int = HISTORY_TOKEN_BUDGET,
+) -> List[Dict[str, str]]:
+    """Monta a lista de mensagens: system, histórico (opcional) e o prompt atual."""
+    messages = [
+        {"role": "system", "content": (
+            "Você é um analista de mídia sênior especializado em Meta Ads. "
+            "Nunca invente dados; se não houver dado, diga claramente. "
+            "Responda primeiro à pergunta, depois mostre evidências e ações."
+        )},
+    ]
+    if history:
+        # Mantém apenas as mensagens mais recentes que cabem no orçamento de tokens
+        trimmed = _fit_history(history, history_token_budget)
+        # Filtra apenas roles suportados
+        for m in trimmed:
+            r = m.get("role", "user")
+            if r not in ("user", "assistant"):
+                r = "user"
+            messages.append({"role": r, "content": m.get("content", "")})
+    # Adiciona a solicitação atual com dados tabulares
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def _make_messages(
+    campaigns: Optional[List[Dict]],
+    adsets: Optional[List[Dict]],
+    ads: Optional[List[Dict]],
+    user_query: str | None,
+    period_label: str | None,
+    intents: Optional[List[str]],
+    cache_prompt: bool,
+    history: Optional[List[Dict[str, str]]],
+) -> List[Dict[str, str]]:
+    """Prompt + mensagens. Síncrono (pandas e contagem de tokens): roda numa thread."""
+    prompt = _make_prompt(campaigns, adsets, ads, user_query, period_label, intents, cache_prompt)
+    return _build_messages(prompt, history)
+
+
+def _make_questions_messages(
+    questions: List[str],
+    campaigns: Optional[List[Dict]],
+    adsets: Optional[List[Dict]],
+    ads: Optional[List[Dict]],
+    period_label: str | None,
+    intents: Optional[List[str]],
+    history: Optional[List[Dict[str, str]]],
+) -> List[Dict[str, str]]:
+    """Mensagens da chamada em lote (uma resposta JSON por pergunta). Também roda numa thread."""
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, start=1))
+    prompt = _build_prompt(
+        campaigns=campaigns,
+        adsets=adsets,
+        ads=ads,
+        user_query=f"Responda a cada pergunta abaixo, na ordem:\n{numbered}",
+        period_label=period_label,
+        intents=intents,
     )
-    user_section = f"\nPergunta do usuário: {user_query}\n" if user_query else ""
-    period_section = f"Período analisado: {period_label}\n" if period_label else ""
-
-    return (
-        f"{instructions}\n{period_section}{user_section}\n"
-        "Disponibilidade de dados:\n"
-        f"{availability}\n\n"
-        "Benchmarks (p25/p50/p75):\n"
-        f"{stats_text}\n\n"
-        "Destaques calculados:\n"
-        f"{highlights}\n\n"
-        "Dados completos (CSV):\n"
-        f"{csv_view}\n"
+    prompt += (
+        "\nFormato da resposta (substitui o formato de saída acima): devolva apenas um JSON "
+        '{"respostas": ["...", "..."]} com exatamente uma string por pergunta, na mesma ordem; '
+        "cada string segue as regras de fundamentação acima.\n"
     )
+    return _build_messages(prompt, history)
 
 
-def analyze_campaigns_with_gpt(
+async def analyze_campaigns_with_gpt(
     campaigns: Optional[List[Dict]],
     api_key: str,
     user_query: str | None = None,
@@ -195,49 +529,114 @@ def analyze_campaigns_with_gpt(
     ads: Optional[List[Dict]] = None,
     history: Optional[List[Dict[str, str]]] = None,
     intents: Optional[List[str]] = None,
+    cache_prompt: bool = False,
 ) -> str:
     """Chama o modelo gpt-4o-mini para analisar as campanhas.
 
     Args:
         campaigns: lista de dicionários normalizados.
         api_key: OPENAI_API_KEY.
+        cache_prompt: reaproveita o prompt montado para entradas idênticas.
     Returns:
         Texto com análise.
     """
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY não encontrado nas variáveis de ambiente.")
 
-    client = OpenAI(api_key=api_key)
+    client = _get_client(api_key)
 
-    prompt = _build_prompt(campaigns=campaigns, adsets=adsets, ads=ads, user_query=user_query, period_label=period_label, intents=intents)
-
-    # Monta histórico conversacional (opcional)
-    messages = [
-        {"role": "system", "content": (
-            "Você é um analista de mídia sênior especializado em Meta Ads. "
-            "Nunca invente dados; se não houver dado, diga claramente. "
-            "Responda primeiro à pergunta, depois mostre evidências e ações."
-        )},
-    ]
-    if history:
-        # Mantém apenas as últimas 8 mensagens para reduzir tokens
-        trimmed = history[-8:]
-        # Filtra apenas roles suportados
-        for m in trimmed:
-            r = m.get("role", "user")
-            if r not in ("user", "assistant"):
-                r = "user"
-            messages.append({"role": r, "content": m.get("content", "")})
-    # Adiciona a solicitação atual com dados tabulares
-    messages.append({"role": "user", "content": prompt})
+    # O trabalho em pandas e a contagem de tokens rodam em uma thread para não travar o event loop
+    messages = await asyncio.to_thread(
+        _make_messages, campaigns, adsets, ads, user_query, period_label, intents, cache_prompt, history
+    )
 
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
+    completion = await _create_completion(
+        client,
         messages=messages,
-        temperature=0.25,
         max_tokens=1600,
-        frequency_penalty=0.2,
-        presence_penalty=0.1,
+        **_COMPLETION_PARAMS,
     )
 
     return completion.choices[0].message.content.strip()
+
+
+async def stream_campaigns_analysis(
+    campaigns: Optional[List[Dict]],
+    api_key: str,
+    user_query: str | None = None,
+    period_label: str | None = None,
+    adsets: Optional[List[Dict]] = None,
+    ads: Optional[List[Dict]] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+    intents: Optional[List[str]] = None,
+    cache_prompt: bool = False,
+) -> AsyncIterator[str]:
+    """Mesma análise de `analyze_campaigns_with_gpt`, devolvida em pedaços.
+
+    Yields:
+        Trechos de texto na ordem em que o modelo os gera (sem sanitização).
+    """
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY não encontrado nas variáveis de ambiente.")
+
+    client = _get_client(api_key)
+
+    messages = await asyncio.to_thread(
+        _make_messages, campaigns, adsets, ads, user_query, period_label, intents, cache_prompt, history
+    )
+    chunks = _stream_completion(client, messages=messages, max_tokens=1600, **_COMPLETION_PARAMS)
+    try:
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Libera o slot já, mesmo se o cliente desconectar no meio do stream
+        await chunks.aclose()
+
+
+async def analyze_questions_with_gpt(
+    questions: List[str],
+    campaigns: Optional[List[Dict]],
+    api_key: str,
+    period_label: str | None = None,
+    adsets: Optional[List[Dict]] = None,
+    ads: Optional[List[Dict]] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+    intents: Optional[List[str]] = None,
+) -> List[str]:
+    """Responde várias perguntas em uma única chamada ao modelo.
+
+    Os dados (CSV, destaques, benchmarks) entram uma única vez no prompt e o
+    modelo devolve um JSON com uma resposta por pergunta, na mesma ordem.
+
+    Returns:
+        Lista de respostas, alinhada com `questions`.
+    """
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY não encontrado nas variáveis de ambiente.")
+
+    client = _get_client(api_key)
+
+    messages = await asyncio.to_thread(
+        _make_questions_messages, questions, campaigns, adsets, ads, period_label, intents, history
+    )
+
+    max_tokens = min(1600 * len(questions), 8000)
+    completion = await _create_completion(
+        client.with_options(timeout=_completion_timeout(max_tokens)),
+        messages=messages,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"},
+        **_COMPLETION_PARAMS,
+    )
+
+    try:
+        answers = json.loads(completion.choices[0].message.content or "")["respostas"]
+    except (ValueError, KeyError, TypeError):
+        answers = None
+    if not isinstance(answers, list):
+        raise RuntimeError("Resposta da IA fora do formato JSON esperado para perguntas em lote.")
+
+    answers = [str(a).strip() for a in answers[: len(questions)]]
+    answers += ["Sem resposta."] * (len(questions) - len(answers))
+    return answers
@@ -5,6 +5,7 @@ Rotas principais:
 - GET /health              -> verifica se o serviço está ok
 - GET /meta/campaigns      -> retorna métricas normalizadas das campanhas
 - GET /meta/analyze        -> retorna texto de análise usando gpt-4o-mini
+- POST /meta/analyze/stream -> mesma análise, enviada em streaming (SSE)
 
 Variáveis de ambiente (via .env):
 - META_ACCESS_TOKEN
@@ -16,18 +17,30 @@ Execução local:
 """
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from typing import List
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple
 import re
 import unicodedata
+from contextlib import asynccontextmanager
 
 import pandas as pd
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
 
 from . import meta_client
-from .ai_client import analyze_campaigns_with_gpt
+from .ai_client import (
+    analyze_campaigns_with_gpt,
+    analyze_questions_with_gpt,
+    stream_campaigns_analysis,
+    warm_tokenizer,
+)
 from .schemas import (
     CampaignMetrics,
     CampaignsResponse,
@@ -48,7 +61,20 @@ META_AD_ACCOUNT_ID = os.getenv("META_AD_ACCOUNT_ID", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 
-app = FastAPI(title="Meta Ads Analyzer API", version="0.1.0")
+# Validação em lote (pydantic-core) das listas normalizadas
+_CAMPAIGNS_TA = TypeAdapter(List[CampaignMetrics])
+_ADSETS_TA = TypeAdapter(List[AdSetMetrics])
+_ADS_TA = TypeAdapter(List[AdMetrics])
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    # Carrega o tokenizer em segundo plano para a primeira análise não pagar o download
+    warm_tokenizer()
+    yield
+
+
+app = FastAPI(title="Meta Ads Analyzer API", version="0.1.0", lifespan=_lifespan)
 
 # CORS liberado para facilitar o acesso do Streamlit local
 app.add_middleware(
@@ -58,6 +84,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Respostas JSON (listas por nível + análise) saem comprimidas; o SSE fica de fora
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 
 @app.get("/health")
@@ -65,6 +93,11 @@ def health():
     return {"status": "ok"}
 
 
+def _json_response(model: BaseModel) -> Response:
+    """Serializa o modelo direto pelo pydantic-core, sem a revalidação/`json.dumps` do response_model."""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
 def _require_env():
     if not META_ACCESS_TOKEN:
         raise HTTPException(status_code=500, detail="META_ACCESS_TOKEN ausente no .env")
@@ -72,6 +105,136 @@ def _require_env():
         raise HTTPException(status_code=500, detail="META_AD_ACCOUNT_ID ausente no .env")
 
 
+# Padrões de limpeza do texto da IA (compilados uma única vez)
+_BANNED_HEADER_RE = re.compile(
+    r"^\s*(?:resposta\s+direta|evid[eê]ncias|a[cç][oõ]es\s+recomendadas"
+    r"|riscos(?:/[oó]bserva[cç][oõ]es)?|pr[oó]ximos\s+passos)\s*:"
+)
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[\-\*•]\s+(?:\d+[\.)\-]\s+)?|\d+[\.)\-]\s+)")
+_MULTI_NEWLINE_RE = re.compile(r"\n{3,}")
+_INTRAWORD_NEWLINE_RE = re.compile(r"(?<=\w)\n(?=\w)")
+_BACKSLASH_RE = re.compile(r"\s*\\\s*")
+_MULTI_SPACE_RE = re.compile(r"[ \t]{2,}")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.;:!?])")
+_OPEN_PAREN_RE = re.compile(r"\(\s+")
+_CLOSE_PAREN_RE = re.compile(r"\s+\)")
+_CURRENCY_RE = re.compile(r"R\$\s+")
+_DECIMAL_COMMA_RE = re.compile(r"(\d)\s*,\s*(\d{1,2})")
+# Pré-checagem: casa qualquer trecho que alguma das etapas acima alteraria.
+# Texto sem nenhum desses padrões sai do pipeline apenas com strip().
+_NEEDS_SANITIZE_RE = re.compile(
+    r"[\x00-\x09\x0b-\x1f\x7f\\]"
+    r"|\n{3,}|(?<!\n)\n(?!\n)"
+    r"|^\s*(?:resposta\s+direta|evid[eê]ncias|a[cç][oõ]es\s+recomendadas|riscos|pr[oó]ximos\s+passos)"
+    r"|^\s*(?:[\-\*•]|\d+[\.)\-])\s"
+    r"|  |\s[,.;:!?]|\(\s|\s\)"
+    r"|R \$|R\$(?:\s\s|[^\S ])"
+    r"|\d\s+,|\d,\s+\d",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+# Palavras-chave da pergunta do usuário. Intenções personalizam o prompt;
+# "ad"/"adset" indicam níveis extras que devem ser buscados.
+_INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "analise_criativos": ["criativo", "criativos", "anuncio", "anúncio", "ads"],
+    "alocacao_orcamento": ["orçamento", "budget", "gastar", "investir", "escala"],
+    "diagnostico": ["problema", "cairam", "queda", "queda de desempenho", "troubleshooting"],
+    "novo_produto": ["novo produto", "novos produtos", "lançar", "lançamento", "go to market"],
+    "estrutura": ["estrutura", "funnel", "funil", "campanhas", "conjuntos"],
+}
+_LEVEL_KEYWORDS: Dict[str, List[str]] = {
+    "ad": ["criativo", "criativos", "anuncio", "anúncio", "ads"],
+    "adset": ["conjunto", "conjuntos", "adset"],
+}
+_ALL_KEYWORDS = {k for kws in (*_INTENT_KEYWORDS.values(), *_LEVEL_KEYWORDS.values()) for k in kws}
+# Cada palavra-chave herda os rótulos das palavras contidas nela ("adset" também casa "ads"),
+# preservando a semântica de substring com uma única varredura do texto.
+_KEYWORD_LABELS: Dict[str, frozenset] = {
+    kw: frozenset(
+        label
+        for label, kws in (*_INTENT_KEYWORDS.items(), *_LEVEL_KEYWORDS.items())
+        if any(k in kw for k in kws)
+    )
+    for kw in _ALL_KEYWORDS
+}
+# Lookahead de largura zero: testa todas as posições, inclusive as que começam dentro de
+# um casamento anterior ("estruturads" casa "estrutura" e também "ads").
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in sorted(_ALL_KEYWORDS, key=len, reverse=True)) + "))"
+)
+
+
+def _detect_keywords(message: str | None) -> Tuple[List[str], Set[str]]:
+    """Retorna (intenções na ordem de `_INTENT_KEYWORDS`, níveis extras) da mensagem."""
+    if not message:
+        return [], set()
+    hits: set = set()
+    for m in _KEYWORD_RE.finditer(message.lower()):
+        hits |= _KEYWORD_LABELS[m.group(1)]
+    return [i for i in _INTENT_KEYWORDS if i in hits], hits & _LEVEL_KEYWORDS.keys()
+
+
+class _ControlCharTable(dict):
+    """Tabela para `str.translate` que descarta caracteres de controle/invisíveis.
+
+    Cada code point é classificado na primeira vez que aparece e fica memorizado;
+    \n e \t são mantidos.
+    """
+
+    def __missing__(self, cp: int):
+        ch = chr(cp)
+        drop = ch not in "\n\t" and unicodedata.category(ch).startswith("C")
+        self[cp] = None if drop else cp
+        return self[cp]
+
+
+_CONTROL_CHARS = _ControlCharTable()
+
+
+def _load_level(level: str, date_preset: str, since: str | None, until: str | None) -> List[Dict[str, Any]]:
+    """Busca e normaliza um nível (campaign | adset | ad) de forma síncrona."""
+    if level == "campaign":
+        raw = meta_client.fetch_insights(
+            access_token=META_ACCESS_TOKEN,
+            ad_account_id=META_AD_ACCOUNT_ID,
+            date_preset=date_preset,
+            since=since,
+            until=until,
+        )
+        return meta_client.normalize_insights(raw)
+    raw = meta_client.fetch_insights_by_level(
+        access_token=META_ACCESS_TOKEN,
+        ad_account_id=META_AD_ACCOUNT_ID,
+        level=level,
+        date_preset=date_preset,
+        since=since,
+        until=until,
+    )
+    if level == "adset":
+        return meta_client.normalize_insights_adset(raw)
+    return meta_client.normalize_insights_ad(raw)
+
+
+async def _load_levels(levels: List[str], date_preset: str, since: str | None, until: str | None) -> Dict[str, List[Dict[str, Any]]]:
+    """Busca os níveis pedidos em paralelo (cada chamada bloqueante roda em uma thread)."""
+    results = await asyncio.gather(
+        *(asyncio.to_thread(_load_level, lvl, date_preset, since, until) for lvl in levels)
+    )
+    return dict(zip(levels, results))
+
+
+def _needs_sanitize(text: str) -> bool:
+    """Indica se o texto tem algo que `_sanitize_analysis` alteraria além do strip()."""
+    if _NEEDS_SANITIZE_RE.search(text):
+        return True
+    if text.isascii():
+        return False
+    # Fora do ASCII: formas de compatibilidade (NFKC) e controles/invisíveis Unicode
+    return not unicodedata.is_normalized("NFKC", text) or len(text.translate(_CONTROL_CHARS)) != len(text)
+
+
+@lru_cache(maxsize=256)
 def _sanitize_analysis(text: str) -> str:
     """Normaliza o texto para ficar legível e sem formatação incorreta.
 
@@ -83,74 +246,55 @@ def _sanitize_analysis(text: str) -> str:
     """
     if not text:
         return text
+    if not _needs_sanitize(text):
+        return text.strip()
 
     # Normaliza quebras
     t = text.replace("\r\n", "\n").replace("\r", "\n")
 
-    # Remove caracteres invisíveis/controle (mantém \n e espaço)
-    filtered = []
-    for ch in t:
-        cat = unicodedata.category(ch)
-        if ch == "\n" or ch == " " or ch == "\t":
-            filtered.append(ch)
-        elif cat.startswith("C") or cat in ("Cf",):
-            # ignora controles/invisíveis
-            continue
-        else:
-            # normaliza forma
-            filtered.append(unicodedata.normalize("NFKC", ch))
-    t = "".join(filtered)
+    # Normaliza forma (NFKC) e remove caracteres invisíveis/controle (mantém \n e \t)
+    t = unicodedata.normalize("NFKC", t).translate(_CONTROL_CHARS)
 
     # Remove cabeçalhos indesejados (variantes)
-    banned = [
-        r"^\s*resposta\s+direta\s*:.*$",
-        r"^\s*evid[eê]ncias\s*:.*$",
-        r"^\s*a[cç][oõ]es\s+recomendadas\s*:.*$",
-        r"^\s*riscos(?:/[oó]bserva[cç][oõ]es)?\s*:.*$",
-        r"^\s*pr[oó]ximos\s+passos\s*:.*$",
-    ]
     lines = t.split("\n")
     cleaned: List[str] = []
     for ln in lines:
-        low = ln.strip().lower()
-        if any(re.match(p, low) for p in banned):
+        if _BANNED_HEADER_RE.match(ln.strip().lower()):
             continue
         # Remove bullet/enumeração no início
-        ln = re.sub(r"^\s*[\-\*•]\s+", "", ln)
-        ln = re.sub(r"^\s*\d+[\.)\-]\s+", "", ln)
-        cleaned.append(ln)
+        cleaned.append(_LIST_MARKER_RE.sub("", ln, count=1))
     t = "\n".join(cleaned)
 
     # Protege parágrafos duplos e trata quebras internas de palavra
-    t = re.sub(r"\n{3,}", "\n\n", t)
+    t = _MULTI_NEWLINE_RE.sub("\n\n", t)
     t = t.strip()
     t = t.replace("\t", " ")
     PARA = "<<PARA>>"
     t = t.replace("\n\n", PARA)
     # Junta quebras entre caracteres de palavra (evita 'l\ni\nh\na')
-    t = re.sub(r"(?<=\w)\n(?=\w)", "", t)
+    t = _INTRAWORD_NEWLINE_RE.sub("", t)
     # Remove barras invertidas soltas
-    t = re.sub(r"\s*\\\s*", "", t)
+    t = _BACKSLASH_RE.sub("", t)
     # Converte demais quebras simples em espaço
     t = t.replace("\n", " ")
     # Restaura parágrafos
     t = t.replace(PARA, "\n\n")
 
     # Normaliza espaços
-    t = re.sub(r"[ \t]{2,}", " ", t)
-    t = re.sub(r"\s+([,.;:!?])", r"\1", t)
-    t = re.sub(r"\(\s+", "(", t)
-    t = re.sub(r"\s+\)", ")", t)
+    t = _MULTI_SPACE_RE.sub(" ", t)
+    t = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", t)
+    t = _OPEN_PAREN_RE.sub("(", t)
+    t = _CLOSE_PAREN_RE.sub(")", t)
     # Ajustes leves de moeda/decimal: 'R $' -> 'R$ ', '195 , 80' -> '195,80'
     t = t.replace("R $", "R$")
-    t = re.sub(r"R\$\s+", "R$ ", t)
-    t = re.sub(r"(\d)\s*,\s*(\d{1,2})", r"\1,\2", t)
+    t = _CURRENCY_RE.sub("R$ ", t)
+    t = _DECIMAL_COMMA_RE.sub(r"\1,\2", t)
 
     return t.strip()
 
 
 @app.get("/meta/campaigns", response_model=CampaignsResponse)
-def get_campaigns(date_preset: str = "last_7d", since: str | None = None, until: str | None = None):
+def get_campaigns(date_preset: str = "last_7d", since: str | None = None, until: str | None = None, refresh: bool = False):
     """Retorna lista de campanhas normalizadas para o período informado."""
     _require_env()
 
@@ -161,18 +305,18 @@ def get_campaigns(date_preset: str = "last_7d", since: str | None = None, until:
             date_preset=date_preset,
             since=since,
             until=until,
+            refresh=refresh,
         )
         norm_list = meta_client.normalize_insights(raw)
 
         # Valida com Pydantic
-        campaigns: List[CampaignMetrics] = [CampaignMetrics(**c) for c in norm_list]
-        return {"campaigns": campaigns, "date_preset": date_preset}
+        return _json_response(CampaignsResponse.model_validate({"campaigns": norm_list, "date_preset": date_preset}))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/meta/analyze", response_model=AnalyzeResponse)
-def analyze(date_preset: str = "last_7d", include_campaigns: bool = True, user_message: str | None = None, since: str | None = None, until: str | None = None):
+async def analyze(date_preset: str = "last_7d", include_campaigns: bool = True, user_message: str | None = None, since: str | None = None, until: str | None = None):
     """Analisa campanhas com GPT-4o-mini e retorna o texto da análise.
 
     Parâmetros:
@@ -182,60 +326,23 @@ def analyze(date_preset: str = "last_7d", include_campaigns: bool = True, user_m
     _require_env()
 
     try:
-        raw = meta_client.fetch_insights(
-            access_token=META_ACCESS_TOKEN,
-            ad_account_id=META_AD_ACCOUNT_ID,
-            date_preset=date_preset,
-            since=since,
-            until=until,
-        )
-        norm_list = meta_client.normalize_insights(raw)
         # Para GET clássico, analisamos campanha e, se a pergunta indicar criativos/conjuntos, buscamos níveis adicionais
-        adsets = None
-        ads = None
-        text = (user_message or "").lower()
-        wants_ads = any(k in text for k in ["criativo", "criativos", "anuncio", "anúncio", "ads"]) if user_message else False
-        wants_adsets = any(k in text for k in ["conjunto", "conjuntos", "adset"]) if user_message else False
-        if wants_adsets:
-            raw_s = meta_client.fetch_insights_by_level(
-                access_token=META_ACCESS_TOKEN,
-                ad_account_id=META_AD_ACCOUNT_ID,
-                level="adset",
-                date_preset=date_preset,
-                since=since,
-                until=until,
-            )
-            adsets = meta_client.normalize_insights_adset(raw_s)
-        if wants_ads:
-            raw_a = meta_client.fetch_insights_by_level(
-                access_token=META_ACCESS_TOKEN,
-                ad_account_id=META_AD_ACCOUNT_ID,
-                level="ad",
-                date_preset=date_preset,
-                since=since,
-                until=until,
-            )
-            ads = meta_client.normalize_insights_ad(raw_a)
+        intent, extra_levels = _detect_keywords(user_message)
+        levels = ["campaign"]
+        if "adset" in extra_levels:
+            levels.append("adset")
+        if "ad" in extra_levels:
+            levels.append("ad")
+        data = await _load_levels(levels, date_preset, since, until)
+        norm_list = data["campaign"]
+        adsets = data.get("adset")
+        ads = data.get("ad")
 
         period_label = f"{since} até {until}" if since and until else date_preset
-        # Enriquecimento leve com detecção de intenção para personalização
-        intent = []
-        if user_message:
-            t = user_message.lower()
-            if any(k in t for k in ["criativo", "criativos", "anuncio", "anúncio", "ads"]):
-                intent.append("analise_criativos")
-            if any(k in t for k in ["orçamento", "budget", "gastar", "investir", "escala"]):
-                intent.append("alocacao_orcamento")
-            if any(k in t for k in ["problema", "cairam", "queda", "queda de desempenho", "troubleshooting"]):
-                intent.append("diagnostico")
-            if any(k in t for k in ["novo produto", "novos produtos", "lançar", "lançamento", "go to market"]):
-                intent.append("novo_produto")
-            if any(k in t for k in ["estrutura", "funnel", "funil", "campanhas", "conjuntos"]):
-                intent.append("estrutura")
         augmented_query = user_message
         if intent:
             augmented_query = f"{user_message}\n\nIntenção detectada: {', '.join(intent)}"
-        analysis_text = analyze_campaigns_with_gpt(
+        analysis_text = await analyze_campaigns_with_gpt(
             norm_list,
             api_key=OPENAI_API_KEY,
             user_query=augmented_query,
@@ -243,11 +350,12 @@ def analyze(date_preset: str = "last_7d", include_campaigns: bool = True, user_m
             adsets=adsets,
             ads=ads,
             intents=intent,
+            cache_prompt=True,
         )
         analysis_text = _sanitize_analysis(analysis_text)
 
         if include_campaigns:
-            campaigns = [CampaignMetrics(**c) for c in norm_list]
+            campaigns = _CAMPAIGNS_TA.validate_python(norm_list)
         else:
             campaigns = None
 
@@ -258,93 +366,81 @@ def analyze(date_preset: str = "last_7d", include_campaigns: bool = True, user_m
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _prepare_analysis(body: AnalyzeRequest) -> Dict[str, Any]:
+    """Busca os níveis pedidos e monta os argumentos comuns das chamadas à IA."""
+    include_levels = body.include_levels or ["campaign", "adset", "ad"]
+    questions = [q for q in (body.user_messages or []) if q and q.strip()]
+    # Refina include_levels com base na(s) pergunta(s) do usuário
+    intent, extra_levels = _detect_keywords(" ".join([body.user_message or "", *questions]))
+    for lvl in ("ad", "adset"):
+        if lvl in extra_levels and lvl not in include_levels:
+            include_levels.append(lvl)
+
+    levels = [lvl for lvl in ("campaign", "adset", "ad") if lvl in include_levels]
+    data = await _load_levels(levels, body.date_preset or "last_7d", body.since, body.until)
+    campaigns = _CAMPAIGNS_TA.validate_python(data["campaign"]) if "campaign" in data else None
+    adsets = _ADSETS_TA.validate_python(data["adset"]) if "adset" in data else None
+    ads = _ADS_TA.validate_python(data["ad"]) if "ad" in data else None
+
+    period_label = f"{body.since} até {body.until}" if body.since and body.until else (body.date_preset or "last_7d")
+    augmented_query = body.user_message
+    if body.user_message and intent:
+        augmented_query = f"{body.user_message}\n\nIntenção detectada: {', '.join(intent)}"
+
+    if questions and body.user_message:
+        questions.insert(0, body.user_message)
+
+    return {
+        "campaigns": campaigns,
+        "adsets": adsets,
+        "ads": ads,
+        "questions": questions,
+        "user_query": augmented_query,
+        "period_label": period_label,
+        "level_kwargs": dict(
+            campaigns=_CAMPAIGNS_TA.dump_python(campaigns) if campaigns else None,
+            adsets=_ADSETS_TA.dump_python(adsets) if adsets else None,
+            ads=_ADS_TA.dump_python(ads) if ads else None,
+            history=[m.model_dump() for m in body.messages] if body.messages else None,
+            intents=intent or None,
+        ),
+    }
+
+
 @app.post("/meta/analyze", response_model=AnalyzeResponse)
-def analyze_post(body: AnalyzeRequest):
+async def analyze_post(body: AnalyzeRequest):
     """Versão POST para conversas/inputs maiores e controle de período."""
     _require_env()
 
     try:
-        include_levels = body.include_levels or ["campaign", "adset", "ad"]
-        # Refina include_levels com base na pergunta do usuário
-        text = (body.user_message or "").lower()
-        if "ad" not in include_levels and any(k in text for k in ["criativo", "criativos", "anuncio", "anúncio", "ads"]):
-            include_levels.append("ad")
-        if "adset" not in include_levels and any(k in text for k in ["conjunto", "conjuntos", "adset"]):
-            include_levels.append("adset")
-
-        campaigns = None
-        adsets = None
-        ads = None
-
-        if "campaign" in include_levels:
-            raw_c = meta_client.fetch_insights(
-                access_token=META_ACCESS_TOKEN,
-                ad_account_id=META_AD_ACCOUNT_ID,
-                date_preset=body.date_preset or "last_7d",
-                since=body.since,
-                until=body.until,
+        prepared = await _prepare_analysis(body)
+
+        if prepared["questions"]:
+            # Perguntas em lote: os dados entram uma única vez no prompt
+            answers = await analyze_questions_with_gpt(
+                prepared["questions"],
+                api_key=OPENAI_API_KEY,
+                period_label=prepared["period_label"],
+                **prepared["level_kwargs"],
             )
-            campaigns = [CampaignMetrics(**c) for c in meta_client.normalize_insights(raw_c)]
-
-        if "adset" in include_levels:
-            raw_s = meta_client.fetch_insights_by_level(
-                access_token=META_ACCESS_TOKEN,
-                ad_account_id=META_AD_ACCOUNT_ID,
-                level="adset",
-                date_preset=body.date_preset or "last_7d",
-                since=body.since,
-                until=body.until,
-            )
-            adsets = [AdSetMetrics(**c) for c in meta_client.normalize_insights_adset(raw_s)]
-
-        if "ad" in include_levels:
-            raw_a = meta_client.fetch_insights_by_level(
-                access_token=META_ACCESS_TOKEN,
-                ad_account_id=META_AD_ACCOUNT_ID,
-                level="ad",
-                date_preset=body.date_preset or "last_7d",
-                since=body.since,
-                until=body.until,
+            answers = [_sanitize_analysis(a) for a in answers]
+            result = {"analysis": "\n\n".join(answers), "analyses": answers}
+        else:
+            analysis_text = await analyze_campaigns_with_gpt(
+                api_key=OPENAI_API_KEY,
+                user_query=prepared["user_query"],
+                period_label=prepared["period_label"],
+                cache_prompt=True,
+                **prepared["level_kwargs"],
             )
-            ads = [AdMetrics(**c) for c in meta_client.normalize_insights_ad(raw_a)]
-
-        period_label = f"{body.since} até {body.until}" if body.since and body.until else (body.date_preset or "last_7d")
-        # Detecção simples de intenção para personalizar a resposta
-        augmented_query = body.user_message
-        if body.user_message:
-            t = body.user_message.lower()
-            intent = []
-            if any(k in t for k in ["criativo", "criativos", "anuncio", "anúncio", "ads"]):
-                intent.append("analise_criativos")
-            if any(k in t for k in ["orçamento", "budget", "gastar", "investir", "escala"]):
-                intent.append("alocacao_orcamento")
-            if any(k in t for k in ["problema", "cairam", "queda", "queda de desempenho", "troubleshooting"]):
-                intent.append("diagnostico")
-            if any(k in t for k in ["novo produto", "novos produtos", "lançar", "lançamento", "go to market"]):
-                intent.append("novo_produto")
-            if any(k in t for k in ["estrutura", "funnel", "funil", "campanhas", "conjuntos"]):
-                intent.append("estrutura")
-            if intent:
-                augmented_query = f"{body.user_message}\n\nIntenção detectada: {', '.join(intent)}"
-        analysis_text = analyze_campaigns_with_gpt(
-            campaigns=[c.dict() for c in campaigns] if campaigns else None,
-            api_key=OPENAI_API_KEY,
-            user_query=augmented_query,
-            period_label=period_label,
-            adsets=[s.dict() for s in adsets] if adsets else None,
-            ads=[a.dict() for a in ads] if ads else None,
-            history=[m.dict() for m in (body.messages or [])] if hasattr(body, "messages") and body.messages else None,
-            intents=intent if body.user_message else None,
-        )
-        analysis_text = _sanitize_analysis(analysis_text)
+            result = {"analysis": _sanitize_analysis(analysis_text)}
 
-        result = {"analysis": analysis_text}
         if body.include_campaigns:
-            result["campaigns"] = campaigns
-            if adsets is not None:
-                result["adsets"] = adsets
-            if ads is not None:
-                result["ads"] = ads
+            result["campaigns"] = prepared["campaigns"]
+            if prepared["adsets"] is not None:
+                result["adsets"] = prepared["adsets"]
+            if prepared["ads"] is not None:
+                result["ads"] = prepared["ads"]
         return result
     except HTTPException:
         raise
@@ -352,12 +448,59 @@ def analyze_post(body: AnalyzeRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(payload: Dict[str, Any], event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.post("/meta/analyze/stream")
+async def analyze_stream(body: AnalyzeRequest):
+    """Versão em streaming (Server-Sent Events) do POST /meta/analyze.
+
+    Emite `data: {"delta": ...}` à medida que o modelo gera o texto e, ao final,
+    um evento `done` com a análise completa já sanitizada. `user_messages` não é
+    suportado aqui (400); use a rota sem streaming para perguntas em lote.
+    """
+    _require_env()
+    if body.user_messages:
+        raise HTTPException(
+            status_code=400,
+            detail="user_messages não é suportado em streaming; use POST /meta/analyze para perguntas em lote.",
+        )
+
+    try:
+        prepared = await _prepare_analysis(body)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        parts: List[str] = []
+        try:
+            async for delta in stream_campaigns_analysis(
+                api_key=OPENAI_API_KEY,
+                user_query=prepared["user_query"],
+                period_label=prepared["period_label"],
+                cache_prompt=True,
+                **prepared["level_kwargs"],
+            ):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+            return
+        yield _sse({"analysis": _sanitize_analysis("".join(parts))}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 if __name__ == "__main__":
     import uvicorn
 
     uvicorn.run("backend.main:app", host="127.0.0.1", port=3000, reload=True)
 @app.get("/meta/adsets", response_model=AdSetsResponse)
-def get_adsets(date_preset: str = "last_7d", since: str | None = None, until: str | None = None):
+def get_adsets(date_preset: str = "last_7d", since: str | None = None, until: str | None = None, refresh: bool = False):
     _require_env()
     try:
         raw = meta_client.fetch_insights_by_level(
@@ -367,16 +510,16 @@ def get_adsets(date_preset: str = "last_7d", since: str | None = None, until: st
             date_preset=date_preset,
             since=since,
             until=until,
+            refresh=refresh,
         )
         norm_list = meta_client.normalize_insights_adset(raw)
-        adsets = [AdSetMetrics(**c) for c in norm_list]
-        return {"adsets": adsets, "date_preset": date_preset}
+        return _json_response(AdSetsResponse.model_validate({"adsets": norm_list, "date_preset": date_preset}))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/meta/ads", response_model=AdsResponse)
-def get_ads(date_preset: str = "last_7d", since: str | None = None, until: str | None = None):
+def get_ads(date_preset: str = "last_7d", since: str | None = None, until: str | None = None, refresh: bool = False):
     _require_env()
     try:
         raw = meta_client.fetch_insights_by_level(
@@ -386,12 +529,12 @@ def get_ads(date_preset: str = "last_7d", since: str | None = None, until: str |
             date_preset=date_preset,
             since=since,
             until=until,
+            refresh=refresh,
         )
         norm_list = meta_client.normalize_insights_ad(raw)
-        ads = [AdMetrics(**c) for c in norm_list]
-        return {"ads": ads, "date_preset": date_preset}
+        return _json_response(AdsResponse.model_validate({"ads": norm_list, "date_preset": date_preset}))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
-
-
+
+
+
@@ -12,25 +12,102 @@ então usamos também o recálculo via clicks/impressions*100 como fallback.
 """
 from __future__ import annotations
 
+import json
+import math
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
 import requests
-from typing import Dict, List, Any
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, List, Sequence
+from urllib3.util.retry import Retry
+
+try:  # parser em C; json da stdlib como alternativa
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover
+    from json import loads as _json_loads
 
 
 GRAPH_BASE = "https://graph.facebook.com/v24.0"
 
+# Sessão compartilhada: as páginas seguintes (e os três níveis buscados em paralelo)
+# reaproveitam a conexão TLS com o Graph. Erros transitórios são repetidos com backoff;
+# raise_on_status=False devolve a última resposta para lermos a mensagem de erro da API.
+_SESSION = requests.Session()
+_SESSION.headers["Accept-Encoding"] = "gzip"
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            raise_on_status=False,
+        ),
+    ),
+)
+
+# Campos pedidos em cada nível (identificação + métricas), já no formato do parâmetro `fields`
+_COMMON_FIELDS = ["impressions", "clicks", "spend", "cpm", "cpc", "ctr", "actions", "action_values"]
+_FIELDS = {
+    "campaign": ",".join(["campaign_id", "campaign_name", *_COMMON_FIELDS]),
+    "adset": ",".join(["adset_id", "adset_name", "campaign_id", *_COMMON_FIELDS]),
+    "ad": ",".join(["ad_id", "ad_name", "adset_id", "campaign_id", *_COMMON_FIELDS]),
+}
+# Parâmetros comuns a toda consulta; ações/valores contados por tempo de conversão
+# (alinha com o Ads Manager)
+_BASE_PARAMS: Dict[str, Any] = {
+    "limit": 5000,
+    "action_report_time": "conversion",
+    "use_unified_attribution_setting": True,
+}
+
+
+def _period_params(date_preset: str, since: str | None, until: str | None) -> Dict[str, str]:
+    """Preset ou intervalo customizado; `time_range` vai serializado em JSON na query string."""
+    if since and until:
+        return {"time_range": json.dumps({"since": since, "until": until}, separators=(",", ":"))}
+    return {"date_preset": date_preset}
+
+
+# Respostas brutas recentes do Graph, por (conta, nível, período). Cliques repetidos na
+# mesma janela não refazem a paginação; o lock protege as buscas paralelas por nível.
+_CACHE: TTLCache = TTLCache(maxsize=128, ttl=120)
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(key: tuple) -> List[Dict[str, Any]] | None:
+    with _CACHE_LOCK:
+        return _CACHE.get(key)
+
+
+def _cache_put(key: tuple, rows: List[Dict[str, Any]]) -> None:
+    with _CACHE_LOCK:
+        _CACHE[key] = rows
+
 
 def _to_int(x: Any) -> int:
-    try:
-        return int(float(x))
-    except Exception:
-        return 0
+    if isinstance(x, int):
+        return int(x)
+    return int(_to_float(x))
 
 
 def _to_float(x: Any) -> float:
+    """Converte números ou strings numéricas; o resto (None, "", NaN, inf, lixo) vira 0.0."""
+    if isinstance(x, float):
+        return x if math.isfinite(x) else 0.0
+    if not isinstance(x, (str, int)):
+        return 0.0
     try:
-        return float(x)
-    except Exception:
+        value = float(x)
+    except (ValueError, OverflowError):
         return 0.0
+    return value if math.isfinite(value) else 0.0
 
 
 def fetch_insights(
@@ -40,6 +117,7 @@ def fetch_insights(
     since: str | None = None,
     until: str | None = None,
     timeout: int = 30,
+    refresh: bool = False,
 ) -> List[Dict[str, Any]]:
     """Busca dados de insights no nível de campanha, com paginação.
 
@@ -48,44 +126,30 @@ def fetch_insights(
         ad_account_id: ID da conta de anúncios, sem o prefixo "act_".
         date_preset: Janela temporal (ex: last_7d, last_14d, last_30d).
         timeout: Timeout da requisição em segundos.
+        refresh: Ignora o cache e busca de novo no Graph (o resultado volta ao cache).
     Returns:
         Lista de objetos brutos retornados pela API.
     Raises:
         RuntimeError em caso de erro da API.
     """
+    cache_key = (ad_account_id, "campaign", date_preset, since, until)
+    cached = None if refresh else _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     url = f"{GRAPH_BASE}/act_{ad_account_id}/insights"
-    params = {
-        "fields": ",".join(
-            [
-                "campaign_id",
-                "campaign_name",
-                "impressions",
-                "clicks",
-                "spend",
-                "cpm",
-                "cpc",
-                "ctr",
-                "actions",
-                "action_values",
-            ]
-        ),
+    params: Dict[str, Any] = {
+        **_BASE_PARAMS,
+        "fields": _FIELDS["campaign"],
         "level": "campaign",
-        "limit": 5000,
         "access_token": access_token,
+        **_period_params(date_preset, since, until),
     }
-    # Garantir que ações/valores sejam contados por tempo de conversão (alinha com o Ads Manager)
-    params["action_report_time"] = "conversion"
-    params["use_unified_attribution_setting"] = True
-    # Permite escolher entre preset e intervalo customizado
-    if since and until:
-        params["time_range"] = {"since": since, "until": until}
-    else:
-        params["date_preset"] = date_preset
 
     all_data: List[Dict[str, Any]] = []
     while True:
-        resp = requests.get(url, params=params, timeout=timeout)
-        data = resp.json()
+        resp = _SESSION.get(url, params=params, timeout=timeout)
+        data = _json_loads(resp.content)
 
         if resp.status_code != 200 or "error" in data:
             err = data.get("error", {})
@@ -104,6 +168,7 @@ def fetch_insights(
         url = next_url
         params = {}
 
+    _cache_put(cache_key, all_data)
     return all_data
 
 
@@ -115,50 +180,33 @@ def fetch_insights_by_level(
     since: str | None = None,
     until: str | None = None,
     timeout: int = 30,
+    refresh: bool = False,
 ) -> List[Dict[str, Any]]:
     """Versão genérica parametrizando o `level`.
 
-    Inclui campos de identificação conforme o nível solicitado.
+    Inclui campos de identificação conforme o nível solicitado. `refresh` ignora o cache.
     """
-    valid_levels = {"campaign", "adset", "ad"}
-    if level not in valid_levels:
+    if level not in _FIELDS:
         raise ValueError(f"level inválido: {level}")
 
-    id_fields = {
-        "campaign": ["campaign_id", "campaign_name"],
-        "adset": ["adset_id", "adset_name", "campaign_id"],
-        "ad": ["ad_id", "ad_name", "adset_id", "campaign_id"],
-    }[level]
-
-    common_fields = [
-        "impressions",
-        "clicks",
-        "spend",
-        "cpm",
-        "cpc",
-        "ctr",
-        "actions",
-        "action_values",
-    ]
+    cache_key = (ad_account_id, level, date_preset, since, until)
+    cached = None if refresh else _cache_get(cache_key)
+    if cached is not None:
+        return cached
 
     url = f"{GRAPH_BASE}/act_{ad_account_id}/insights"
     params: Dict[str, Any] = {
-        "fields": ",".join(id_fields + common_fields),
+        **_BASE_PARAMS,
+        "fields": _FIELDS[level],
         "level": level,
-        "limit": 5000,
         "access_token": access_token,
+        **_period_params(date_preset, since, until),
     }
-    params["action_report_time"] = "conversion"
-    params["use_unified_attribution_setting"] = True
-    if since and until:
-        params["time_range"] = {"since": since, "until": until}
-    else:
-        params["date_preset"] = date_preset
 
     all_data: List[Dict[str, Any]] = []
     while True:
-        resp = requests.get(url, params=params, timeout=timeout)
-        data = resp.json()
+        resp = _SESSION.get(url, params=params, timeout=timeout)
+        data = _json_loads(resp.content)
 
         if resp.status_code != 200 or "error" in data:
             err = data.get("error", {})
@@ -176,12 +224,12 @@ def fetch_insights_by_level(
         url = next_url
         params = {}
 
+    _cache_put(cache_key, all_data)
     return all_data
 
 
-def _is_purchase_type(action_type: str) -> bool:
-    at = (action_type or "").lower()
-    allowed = {
+_PURCHASE_TYPES = frozenset(
+    {
         "purchase",
         "fb_pixel_purchase",
         "offsite_conversion.purchase",
@@ -189,7 +237,14 @@ def _is_purchase_type(action_type: str) -> bool:
         "onsite_conversion.purchase",
         "omni_purchase",
     }
-    return at in allowed or at.endswith(".purchase") or at.endswith("_purchase")
+)
+
+
+@lru_cache(maxsize=256)
+def _is_purchase_type(action_type: str) -> bool:
+    # A API usa poucas dezenas de action_type distintos: cada um é classificado uma vez
+    at = action_type.lower()
+    return at in _PURCHASE_TYPES or at.endswith(".purchase") or at.endswith("_purchase")
 
 
 PURCHASE_PRIORITY = [
@@ -202,32 +257,92 @@ PURCHASE_PRIORITY = [
 ]
 
 
-def _pick_purchase_count(actions: List[Dict[str, Any]]) -> int:
-    by_type = {str(a.get("action_type", "")).lower(): a for a in (actions or [])}
-    for t in PURCHASE_PRIORITY:
-        a = by_type.get(t)
-        if a is not None:
-            return _to_int(a.get("value", 0))
-    # fallback: soma de todos os tipos de purchase (evitar zero absoluto)
-    total = 0
-    for a in actions or []:
-        if _is_purchase_type(a.get("action_type")):
-            total += _to_int(a.get("value", 0))
-    return total
-
-
-def _pick_purchase_value(action_values: List[Dict[str, Any]]) -> float:
-    by_type = {str(a.get("action_type", "")).lower(): a for a in (action_values or [])}
-    for t in PURCHASE_PRIORITY:
-        a = by_type.get(t)
-        if a is not None:
-            return _to_float(a.get("value", 0.0))
-    # fallback: soma (se não houver nenhum dos tipos preferidos)
-    total = 0.0
-    for av in action_values or []:
-        if _is_purchase_type(av.get("action_type")):
-            total += _to_float(av.get("value", 0.0))
-    return total
+# Posição de cada tipo em PURCHASE_PRIORITY (menor = preferido)
+_PRIO = {t: i for i, t in enumerate(PURCHASE_PRIORITY)}
+
+
+def _pick_purchase(items: Sequence[Dict[str, Any]], convert: Callable[[Any], Any]) -> Any:
+    """Valor do tipo de compra mais prioritário, numa única passada pela lista.
+
+    Sem nenhum tipo de PURCHASE_PRIORITY, soma todos os tipos de purchase (evitar zero
+    absoluto). Tipos repetidos: vale a última ocorrência.
+    """
+    best_rank = len(PURCHASE_PRIORITY)
+    best = None
+    total = convert(0)
+    for a in items:
+        at = (a.get("action_type") or "").lower()
+        rank = _PRIO.get(at)
+        if rank is not None:
+            if rank <= best_rank:
+                best_rank, best = rank, a
+        elif _is_purchase_type(at):
+            total += convert(a.get("value", 0))
+    return convert(best.get("value", 0)) if best is not None else total
+
+
+def _pick_purchase_count(actions: Sequence[Dict[str, Any]]) -> int:
+    return _pick_purchase(actions, _to_int)
+
+
+def _pick_purchase_value(action_values: Sequence[Dict[str, Any]]) -> float:
+    return _pick_purchase(action_values, _to_float)
+
+
+# Colunas numéricas vindas da API (como string)
+_INT_FIELDS = ("impressions", "clicks")
+_FLOAT_FIELDS = ("spend", "cpm", "cpc", "ctr")
+
+# Campos de identificação de cada nível, com o valor padrão quando ausentes
+_ID_FIELDS: Dict[str, List[tuple]] = {
+    "campaign": [("campaign_id", ""), ("campaign_name", "(sem nome)")],
+    "adset": [("adset_id", ""), ("adset_name", "(sem nome)"), ("campaign_id", None)],
+    "ad": [("ad_id", ""), ("ad_name", "(sem nome)"), ("adset_id", None), ("campaign_id", None)],
+}
+
+
+def _numeric_column(raw: List[Dict[str, Any]], col: str) -> np.ndarray:
+    """Converte o campo de todas as linhas para float64; ausentes, inválidos e infinitos viram 0."""
+    values = pd.to_numeric(pd.Series([row.get(col) for row in raw], dtype=object), errors="coerce")
+    values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isfinite(values), values, 0.0)
+
+
+def _normalize(raw: List[Dict[str, Any]], level: str) -> List[Dict[str, Any]]:
+    """Normalização vetorizada, comum aos três níveis (campaign | adset | ad).
+
+    Copia os campos de `_ID_FIELDS[level]` de cada linha e converte as métricas
+    coluna a coluna com NumPy.
+    """
+    if not raw:
+        return []
+    columns: Dict[str, Any] = {}
+    for field, default in _ID_FIELDS[level]:
+        columns[field] = [v if (v := row.get(field)) is not None else default for row in raw]
+
+    for col in _INT_FIELDS:
+        columns[col] = np.trunc(_numeric_column(raw, col)).astype(np.int64)
+    for col in _FLOAT_FIELDS:
+        columns[col] = _numeric_column(raw, col)
+
+    # Recalcula CTR em % como fallback
+    impressions = columns["impressions"]
+    ctr_calc = np.divide(columns["clicks"] * 100.0, impressions, out=np.zeros(len(raw)), where=impressions > 0)
+    columns["ctr"] = np.where(ctr_calc > 0, ctr_calc, columns["ctr"])
+
+    # actions/action_values são listas aninhadas: um único passe por linha
+    columns["purchases"] = [_pick_purchase_count(row.get("actions") or ()) for row in raw]
+    purchase_value = np.array([_pick_purchase_value(row.get("action_values") or ()) for row in raw], dtype=np.float64)
+    columns["purchase_value"] = purchase_value
+
+    spend = columns["spend"]
+    columns["roas"] = np.divide(purchase_value, spend, out=np.zeros(len(raw)), where=spend > 0)
+
+    # Sem arredondamento: a formatação fica a cargo de quem exibe (frontend/prompt)
+    # tolist() devolve int/float nativos do Python
+    values = [c.tolist() if isinstance(c, np.ndarray) else c for c in columns.values()]
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*values)]
 
 
 def normalize_insights(raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -238,116 +353,12 @@ def normalize_insights(raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     - Purchases: soma de qualquer action_type contendo "purchase"
     - Purchase_value: soma dos action_values com action_type contendo "purchase"
     """
-    normalized: List[Dict[str, Any]] = []
-    for row in raw:
-        impressions = _to_int(row.get("impressions", 0))
-        clicks = _to_int(row.get("clicks", 0))
-        spend = _to_float(row.get("spend", 0.0))
-        cpm = _to_float(row.get("cpm", 0.0))
-        cpc = _to_float(row.get("cpc", 0.0))
-        ctr_raw = _to_float(row.get("ctr", 0.0))
-
-        # Recalcula CTR em % como fallback
-        ctr_calc = (clicks / impressions * 100.0) if impressions > 0 else 0.0
-        ctr = ctr_calc if ctr_calc > 0 else ctr_raw
-
-        actions = row.get("actions", []) or []
-        action_values = row.get("action_values", []) or []
-
-        purchases = _pick_purchase_count(actions)
-        purchase_value = _pick_purchase_value(action_values)
-
-        roas = (purchase_value / spend) if spend > 0 else 0.0
-
-        normalized.append(
-            {
-                "campaign_id": row.get("campaign_id", ""),
-                "campaign_name": row.get("campaign_name", "(sem nome)"),
-                "impressions": impressions,
-                "clicks": clicks,
-                "spend": round(spend, 4),
-                "cpm": round(cpm, 4),
-                "cpc": round(cpc, 4),
-                "ctr": round(ctr, 4),
-                "purchases": purchases,
-                "purchase_value": round(purchase_value, 4),
-                "roas": round(roas, 4),
-            }
-        )
-
-    return normalized
+    return _normalize(raw, "campaign")
 
 
 def normalize_insights_adset(raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    normalized: List[Dict[str, Any]] = []
-    for row in raw:
-        impressions = _to_int(row.get("impressions", 0))
-        clicks = _to_int(row.get("clicks", 0))
-        spend = _to_float(row.get("spend", 0.0))
-        cpm = _to_float(row.get("cpm", 0.0))
-        cpc = _to_float(row.get("cpc", 0.0))
-        ctr_raw = _to_float(row.get("ctr", 0.0))
-        ctr_calc = (clicks / impressions * 100.0) if impressions > 0 else 0.0
-        ctr = ctr_calc if ctr_calc > 0 else ctr_raw
-
-        actions = row.get("actions", []) or []
-        action_values = row.get("action_values", []) or []
-        purchases = _pick_purchase_count(actions)
-        purchase_value = _pick_purchase_value(action_values)
-        roas = (purchase_value / spend) if spend > 0 else 0.0
-
-        normalized.append(
-            {
-                "adset_id": row.get("adset_id", ""),
-                "adset_name": row.get("adset_name", "(sem nome)"),
-                "campaign_id": row.get("campaign_id"),
-                "impressions": impressions,
-                "clicks": clicks,
-                "spend": round(spend, 4),
-                "cpm": round(cpm, 4),
-                "cpc": round(cpc, 4),
-                "ctr": round(ctr, 4),
-                "purchases": purchases,
-                "purchase_value": round(purchase_value, 4),
-                "roas": round(roas, 4),
-            }
-        )
-    return normalized
+    return _normalize(raw, "adset")
 
 
 def normalize_insights_ad(raw: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    normalized: List[Dict[str, Any]] = []
-    for row in raw:
-        impressions = _to_int(row.get("impressions", 0))
-        clicks = _to_int(row.get("clicks", 0))
-        spend = _to_float(row.get("spend", 0.0))
-        cpm = _to_float(row.get("cpm", 0.0))
-        cpc = _to_float(row.get("cpc", 0.0))
-        ctr_raw = _to_float(row.get("ctr", 0.0))
-        ctr_calc = (clicks / impressions * 100.0) if impressions > 0 else 0.0
-        ctr = ctr_calc if ctr_calc > 0 else ctr_raw
-
-        actions = row.get("actions", []) or []
-        action_values = row.get("action_values", []) or []
-        purchases = _pick_purchase_count(actions)
-        purchase_value = _pick_purchase_value(action_values)
-        roas = (purchase_value / spend) if spend > 0 else 0.0
-
-        normalized.append(
-            {
-                "ad_id": row.get("ad_id", ""),
-                "ad_name": row.get("ad_name", "(sem nome)"),
-                "adset_id": row.get("adset_id"),
-                "campaign_id": row.get("campaign_id"),
-                "impressions": impressions,
-                "clicks": clicks,
-                "spend": round(spend, 4),
-                "cpm": round(cpm, 4),
-                "cpc": round(cpc, 4),
-                "ctr": round(ctr, 4),
-                "purchases": purchases,
-                "purchase_value": round(purchase_value, 4),
-                "roas": round(roas, 4),
-            }
-        )
-    return normalized
+    return _normalize(raw, "ad")
@@ -24,6 +24,7 @@ class CampaignsResponse(BaseModel):
 
 class AnalyzeResponse(BaseModel):
     analysis: str
+    analyses: Optional[List[str]] = None  # uma resposta por item de `user_messages`
     campaigns: Optional[List[CampaignMetrics]] = None
     adsets: Optional[List["AdSetMetrics"]] = None
     ads: Optional[List["AdMetrics"]] = None
@@ -36,6 +37,7 @@ class ErrorResponse(BaseModel):
 class AnalyzeRequest(BaseModel):
     """Entrada para análise interativa com escolha de período e prompt do usuário."""
     user_message: Optional[str] = None
+    user_messages: Optional[List[str]] = None  # várias perguntas respondidas em uma única chamada
     date_preset: Optional[str] = "last_7d"  # ex.: last_7d, maximum, etc.
     since: Optional[str] = None  # YYYY-MM-DD
     until: Optional[str] = None  # YYYY-MM-DD
@@ -93,9 +95,7 @@ class ChatMessage(BaseModel):
     content: str
 
 
-try:
-    AnalyzeResponse.update_forward_refs(AdSetMetrics=AdSetMetrics, AdMetrics=AdMetrics)
-    AnalyzeRequest.update_forward_refs(ChatMessage=ChatMessage)
-except Exception:
-    pass
-
+# Resolve as referências adiantadas ("AdSetMetrics", "AdMetrics", "ChatMessage")
+AnalyzeResponse.model_rebuild()
+AnalyzeRequest.model_rebuild()
+
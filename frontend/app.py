@@ -8,16 +8,70 @@ Como executar (em terminais separados):
 from __future__ import annotations
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 import requests
 import pandas as pd
 import streamlit as st
 import re as _re
 
+try:  # parser em C; json da stdlib como alternativa
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover
+    from json import loads as _json_loads
+
 
 # URL do backend (pode ser alterado via variável de ambiente BACKEND_URL)
 BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:3000")
 
+
+@st.cache_resource
+def _http_session() -> requests.Session:
+    """Sessão HTTP (keep-alive) com o backend, criada uma vez por processo.
+
+    O Streamlit reexecuta o script a cada interação; como recurso em cache, o pool
+    de conexões sobrevive aos reruns.
+    """
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+_http = _http_session()
+
+# Colapsa 3+ quebras de linha em um parágrafo (compilado uma vez; o script roda a cada interação)
+_NL3 = _re.compile(r"\n{3,}")
+
+
+def _json(resp: requests.Response):
+    """Decodifica o corpo JSON direto dos bytes da resposta."""
+    return _json_loads(resp.content)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_level(
+    endpoint: str, date_preset: str | None, since: str | None, until: str | None, refresh: bool = False
+) -> list:
+    """GET /meta/<endpoint> (campaigns | adsets | ads); o mesmo período dentro de 60 s vem do cache.
+
+    Com `refresh`, o backend também ignora o cache dele e busca de novo no Graph.
+    """
+    params = {"date_preset": date_preset} if date_preset else {"since": since, "until": until}
+    if refresh:
+        params["refresh"] = "true"
+    resp = _http.get(f"{BACKEND_URL}/meta/{endpoint}", params=params, timeout=60)
+    resp.raise_for_status()
+    return _json(resp).get(endpoint, [])
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _post_analyze(payload: dict) -> dict:
+    """POST /meta/analyze; o mesmo payload dentro de 60 s reaproveita a resposta anterior."""
+    resp = _http.post(f"{BACKEND_URL}/meta/analyze", json=payload, timeout=180)
+    resp.raise_for_status()
+    return _json(resp)
+
+
 # Guia de estilo injetado junto da pergunta do usuário para melhorar personalização
 STYLE_GUIDE = (
     "Você é uma IA estrategista de marketing e mídia paga. "
@@ -28,6 +82,26 @@ STYLE_GUIDE = (
     "FOCO: se houver 'focus' (criativos, orçamento, diagnóstico, lançamento, estrutura), use apenas para escolher o que abordar, NUNCA para mudar o formato. "
 )
 
+
+@st.cache_data(show_spinner=False)
+def _prompt_prefix(focus: str | None) -> str:
+    """Guia de estilo (+ linha de foco) que antecede a pergunta enviada à IA."""
+    if focus:
+        return f"{STYLE_GUIDE}\n\nFoco: {focus}"
+    return f"{STYLE_GUIDE}\n"
+
+
+# Formatação das métricas só na exibição (o backend devolve os valores sem arredondar)
+_METRIC_FORMATS = {
+    "spend": st.column_config.NumberColumn(format="%.2f"),
+    "cpm": st.column_config.NumberColumn(format="%.2f"),
+    "cpc": st.column_config.NumberColumn(format="%.2f"),
+    "ctr": st.column_config.NumberColumn(format="%.2f%%"),
+    "purchase_value": st.column_config.NumberColumn(format="%.2f"),
+    "roas": st.column_config.NumberColumn(format="%.2f"),
+}
+
+
 st.set_page_config(page_title="Meta Ads + IA", page_icon="📊", layout="wide")
 st.markdown(
     """
@@ -52,18 +126,69 @@ st.markdown(
 st.caption("Backend: FastAPI · Frontend: Streamlit")
 
 
-if "campaigns_df" not in st.session_state:
-    st.session_state.campaigns_df = pd.DataFrame()
-if "adsets_df" not in st.session_state:
-    st.session_state.adsets_df = pd.DataFrame()
-if "ads_df" not in st.session_state:
-    st.session_state.ads_df = pd.DataFrame()
+# Listas brutas por nível (campaigns | adsets | ads); o DataFrame é montado só na exibição
+for level in ("campaigns", "adsets", "ads"):
+    if f"{level}_raw" not in st.session_state:
+        st.session_state[f"{level}_raw"] = []
 if "analysis_text" not in st.session_state:
     st.session_state.analysis_text = ""
 if "messages" not in st.session_state:
     st.session_state.messages = []  # [{role: "user"|"assistant", content: str}]
 
 
+# Colunas e tipos de cada nível, na ordem de exibição (espelha os modelos do backend)
+_METRIC_COLUMNS = [
+    ("impressions", "Int64"),
+    ("clicks", "Int64"),
+    ("spend", "float64"),
+    ("cpm", "float64"),
+    ("cpc", "float64"),
+    ("ctr", "float64"),
+    ("purchases", "Int64"),
+    ("purchase_value", "float64"),
+    ("roas", "float64"),
+]
+_LEVEL_COLUMNS = {
+    "campaigns": [("campaign_id", "string"), ("campaign_name", "string"), *_METRIC_COLUMNS],
+    "adsets": [("adset_id", "string"), ("adset_name", "string"), ("campaign_id", "string"), *_METRIC_COLUMNS],
+    "ads": [
+        ("ad_id", "string"),
+        ("ad_name", "string"),
+        ("adset_id", "string"),
+        ("campaign_id", "string"),
+        *_METRIC_COLUMNS,
+    ],
+}
+
+
+def _request_refresh() -> None:
+    """Descarta o cache local e marca a próxima busca para ignorar também o cache do backend."""
+    _fetch_level.clear()
+    st.session_state.refresh_levels = True
+
+
+def _set_level(level: str, rows: list) -> None:
+    """Guarda a lista do nível, mantendo o objeto atual quando o conteúdo não mudou."""
+    if rows != st.session_state[f"{level}_raw"]:
+        st.session_state[f"{level}_raw"] = rows
+
+
+def _level_df(level: str) -> pd.DataFrame:
+    """DataFrame do nível, reconstruído só quando a lista bruta é trocada.
+
+    As colunas e tipos vêm de `_LEVEL_COLUMNS`, sem inferência sobre a lista de dicts.
+    """
+    raw = st.session_state[f"{level}_raw"]
+    cached = st.session_state.get(f"_{level}_df_cache")
+    if cached is None or cached[0] is not raw:
+        df = pd.DataFrame(
+            {col: pd.array([row.get(col) for row in raw], dtype=dtype) for col, dtype in _LEVEL_COLUMNS[level]}
+        )
+        cached = (raw, df)
+        st.session_state[f"_{level}_df_cache"] = cached
+    return cached[1]
+
+
 with st.sidebar:
     st.header("Configuração")
     date_mode = st.radio("Período", ["Preset", "Personalizado"], index=0, horizontal=True)
@@ -116,26 +241,25 @@ with col1:
         loading = st.empty()
         loading.info("Carregando dados das campanhas…")
         try:
-            params = {"date_preset": date_preset} if date_preset else {"since": since, "until": until}
-            if show_campaigns:
-                resp = requests.get(f"{BACKEND_URL}/meta/campaigns", params=params, timeout=60)
-                resp.raise_for_status()
-                data = resp.json()
-                st.session_state.campaigns_df = pd.DataFrame(data.get("campaigns", []))
-            if show_adsets:
-                resp = requests.get(f"{BACKEND_URL}/meta/adsets", params=params, timeout=60)
-                resp.raise_for_status()
-                data = resp.json()
-                st.session_state["adsets_df"] = pd.DataFrame(data.get("adsets", []))
-            if show_ads:
-                resp = requests.get(f"{BACKEND_URL}/meta/ads", params=params, timeout=60)
-                resp.raise_for_status()
-                data = resp.json()
-                st.session_state["ads_df"] = pd.DataFrame(data.get("ads", []))
+            endpoints = [
+                ep for ep, show in (("campaigns", show_campaigns), ("adsets", show_adsets), ("ads", show_ads)) if show
+            ]
+            refresh = st.session_state.get("refresh_levels", False)
+            # Os três níveis são buscados em paralelo; o session_state só é alterado na thread principal
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                futures = {ep: pool.submit(_fetch_level, ep, date_preset, since, until, refresh) for ep in endpoints}
+            for ep, future in futures.items():
+                _set_level(ep, future.result())
+            st.session_state.refresh_levels = False
             loading.success("Dados carregados!")
         except Exception as e:
             loading.empty()
             st.error(f"Erro ao buscar campanhas: {e}")
+    st.button(
+        "Atualizar",
+        on_click=_request_refresh,
+        help="Descarta os dados em cache (aqui e no backend); o próximo 'Ver campanhas' busca tudo de novo na Meta.",
+    )
 
 with col2:
     if st.button("Analisar com IA"):
@@ -143,7 +267,7 @@ with col2:
         loading.info("Analisando campanhas com IA…")
         try:
             payload = {
-                "user_message": STYLE_GUIDE + "\n\nPergunta: análise geral baseada nos dados carregados, seguindo as regras de estilo.",
+                "user_message": f"{_prompt_prefix(None)}\nPergunta: análise geral baseada nos dados carregados, seguindo as regras de estilo.",
                 "include_campaigns": True,
                 "include_levels": [
                     *(["campaign"] if show_campaigns else []),
@@ -160,16 +284,11 @@ with col2:
                 payload["focus"] = focus
             if st.session_state.messages:
                 payload["messages"] = st.session_state.messages[-6:]
-            resp = requests.post(f"{BACKEND_URL}/meta/analyze", json=payload, timeout=180)
-            resp.raise_for_status()
-            data = resp.json()
+            data = _post_analyze(payload)
             st.session_state.analysis_text = data.get("analysis", "")
-            if data.get("campaigns"):
-                st.session_state.campaigns_df = pd.DataFrame(data["campaigns"]) 
-            if data.get("adsets"):
-                st.session_state["adsets_df"] = pd.DataFrame(data["adsets"]) 
-            if data.get("ads"):
-                st.session_state["ads_df"] = pd.DataFrame(data["ads"]) 
+            for level in ("campaigns", "adsets", "ads"):
+                if data.get(level):
+                    _set_level(level, data[level])
             loading.success("Análise concluída!")
         except Exception as e:
             loading.empty()
@@ -180,26 +299,26 @@ st.markdown("<div class='section-title'>Dados</div>", unsafe_allow_html=True)
 tabs = st.tabs(["Campanhas", "Conjuntos", "Anúncios"])
 with tabs[0]:
     if show_campaigns:
-        if st.session_state.get("campaigns_df", pd.DataFrame()).empty:
+        if not st.session_state.campaigns_raw:
             st.info("Clique em 'Ver campanhas' para carregar os dados.")
         else:
-            st.dataframe(st.session_state.campaigns_df, use_container_width=True, hide_index=True)
+            st.dataframe(_level_df("campaigns"), use_container_width=True, hide_index=True, column_config=_METRIC_FORMATS)
     else:
         st.caption("Oculto nas opções da barra lateral.")
 with tabs[1]:
     if show_adsets:
-        if st.session_state.get("adsets_df", pd.DataFrame()).empty:
+        if not st.session_state.adsets_raw:
             st.info("Carregue os conjuntos pelo botão 'Ver campanhas'.")
         else:
-            st.dataframe(st.session_state["adsets_df"], use_container_width=True, hide_index=True)
+            st.dataframe(_level_df("adsets"), use_container_width=True, hide_index=True, column_config=_METRIC_FORMATS)
     else:
         st.caption("Oculto nas opções da barra lateral.")
 with tabs[2]:
     if show_ads:
-        if st.session_state.get("ads_df", pd.DataFrame()).empty:
+        if not st.session_state.ads_raw:
             st.info("Carregue os anúncios pelo botão 'Ver campanhas'.")
         else:
-            st.dataframe(st.session_state["ads_df"], use_container_width=True, hide_index=True)
+            st.dataframe(_level_df("ads"), use_container_width=True, hide_index=True, column_config=_METRIC_FORMATS)
     else:
         st.caption("Oculto nas opções da barra lateral.")
 
@@ -208,7 +327,7 @@ st.markdown("<div class='section-title'>Análise da IA</div>", unsafe_allow_html
 if not st.session_state.analysis_text:
     st.info("Clique em 'Analisar com IA' para gerar insights.")
 else:
-    _txt = _re.sub(r"\n{3,}", "\n\n", st.session_state.analysis_text or "").strip()
+    _txt = _NL3.sub("\n\n", st.session_state.analysis_text or "").strip()
     st.markdown(_txt)
 
 
@@ -239,26 +358,23 @@ if user_input := st.chat_input("Faça uma pergunta sobre suas campanhas..."):
             payload["until"] = until
 
         if focus and focus != "auto":
-            payload["user_message"] = f"{STYLE_GUIDE}\n\nFoco: {focus}\nPergunta: {user_input}"
             payload["focus"] = focus
-        else:
-            payload["user_message"] = f"{STYLE_GUIDE}\n\nPergunta: {user_input}"
+        prefix = _prompt_prefix(focus if focus != "auto" else None)
+        payload["user_message"] = f"{prefix}\nPergunta: {user_input}"
 
-        payload["messages"] = st.session_state.messages
+        # Só as últimas mensagens: o corpo da requisição não cresce com a conversa
+        payload["messages"] = st.session_state.messages[-8:]
         loading = st.empty()
         loading.info("Gerando resposta personalizada…")
-        resp = requests.post(f"{BACKEND_URL}/meta/analyze", json=payload, timeout=180)
+        resp = _http.post(f"{BACKEND_URL}/meta/analyze", json=payload, timeout=180)
         resp.raise_for_status()
-        data = resp.json()
+        data = _json(resp)
         loading.empty()
 
         assistant_text = data.get("analysis", "")
-        if data.get("campaigns"):
-            st.session_state.campaigns_df = pd.DataFrame(data["campaigns"])
-        if data.get("adsets"):
-            st.session_state["adsets_df"] = pd.DataFrame(data["adsets"])
-        if data.get("ads"):
-            st.session_state["ads_df"] = pd.DataFrame(data["ads"])
+        for level in ("campaigns", "adsets", "ads"):
+            if data.get(level):
+                _set_level(level, data[level])
 
         st.session_state.analysis_text = assistant_text
         st.session_state.messages.append({"role": "assistant", "content": assistant_text})